@@ -2,15 +2,22 @@
 
 from __future__ import annotations
 
-import json
+import bisect
+import mimetypes
 import os
 import re
 import shutil
 import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import IO, Deque, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote
 
+import orjson
 from flask import (
     Flask,
     abort,
@@ -18,51 +25,119 @@ from flask import (
     redirect,
     render_template,
     request,
-    session,
     send_from_directory,
     url_for,
 )
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 
 
 class ProcessingError(Exception):
     """Raised when FFmpeg or related processing fails."""
 
-
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key")
 app.config["MAX_CONTENT_LENGTH"] = 20 * 1024 * 1024 * 1024  # 20 GB
 app.config["UPLOAD_ROOT"] = Path(app.root_path) / "media"
 app.config["UPLOAD_ROOT"].mkdir(parents=True, exist_ok=True)
+# Offload media delivery to a fronting server: X-Sendfile (Apache/lighttpd) or an nginx
+# internal location prefix for X-Accel-Redirect, e.g. "/_protected".
+app.config["USE_X_SENDFILE"] = os.environ.get("FLASK_USE_X_SENDFILE") == "1"
+app.config["X_ACCEL_REDIRECT_PREFIX"] = os.environ.get("FLASK_X_ACCEL_REDIRECT_PREFIX")
+
+# HLS segments; some platforms map .ts to TypeScript or Qt Linguist instead.
+mimetypes.add_type("video/mp2t", ".ts")
 
 RESOLUTION_PRESETS = [2160, 1440, 1080, 720, 480, 360]
-ALLOWED_EXTENSIONS = {"mp4", "mov", "mkv", "webm"}
+ALLOWED_EXTENSIONS = frozenset({"mp4", "mov", "mkv", "webm"})
+UPLOAD_COPY_BUFFER = 4 * 1024 * 1024
+STDERR_TAIL_LINES = 12
+
+TRASH_SUFFIX = ".trash"
+
+# Heights at or above each threshold get the next, lower CRF value.
+_CRF_THRESHOLDS = (480, 720, 1080, 1440, 2160)
+_CRF_VALUES = (25, 24, 23, 22, 21, 20)
+_SLUG_RE = re.compile(r"[^A-Za-z0-9-]+")
+_UPLOAD_ROOT_PREFIX = str(app.config["UPLOAD_ROOT"]) + os.sep
+_cleanup_pool = ThreadPoolExecutor(max_workers=2)
+_manifests_cache: Optional[Tuple[Tuple[int, float], List[Dict], Dict[str, Dict]]] = None
+_manifests_generation = 0
 
 
 def allowed_file(filename: str) -> bool:
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, extension = filename.rpartition(".")
+    return bool(dot) and extension.lower() in ALLOWED_EXTENSIONS
+
+
+def drain_stderr(stream: IO[str], tail: Deque[str]) -> None:
+    # ffmpeg blocks once the pipe buffer fills, so stderr must always be read to EOF.
+    try:
+        for line in stream:
+            tail.append(line)
+    except Exception:  # pylint: disable=broad-except
+        while stream.buffer.read(64 * 1024):
+            pass
 
 
 def run_command(command: List[str]) -> subprocess.CompletedProcess[str]:
     try:
-        result = subprocess.run(
+        process = subprocess.Popen(
             command,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            check=True,
+            errors="replace",
         )
     except FileNotFoundError as exc:
         raise ProcessingError(
             "FFmpeg binaries not found. Ensure ffmpeg and ffprobe are installed and on your PATH."
         ) from exc
-    except subprocess.CalledProcessError as exc:
-        stderr_tail = "\n".join(exc.stderr.splitlines()[-12:]) if exc.stderr else "(no stderr output)"
-        raise ProcessingError(f"Command failed: {' '.join(command)}\n{stderr_tail}") from exc
-    return result
+
+    # Long encodes print megabytes of progress; only the tail is ever reported.
+    stderr_tail: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+    with process:
+        reader = threading.Thread(target=drain_stderr, args=(process.stderr, stderr_tail), daemon=True)
+        reader.start()
+        stdout = process.stdout.read()
+        process.wait()
+        reader.join()
+
+    stderr = "".join(stderr_tail)
+    if process.returncode != 0:
+        stderr_output = stderr.rstrip("\n") or "(no stderr output)"
+        raise ProcessingError(f"Command failed: {' '.join(command)}\n{stderr_output}")
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+def save_upload(uploaded_file: FileStorage, destination: Path) -> None:
+    stream = uploaded_file.stream
+    try:
+        source_fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        source_fd = None
+
+    with destination.open("wb") as handle:
+        if source_fd is not None and hasattr(os, "copy_file_range"):
+            # Large uploads are spooled to a temporary file; let the kernel copy it.
+            try:
+                os.lseek(source_fd, 0, os.SEEK_SET)
+                while os.copy_file_range(source_fd, handle.fileno(), 1 << 30):
+                    pass
+                return
+            except OSError:
+                handle.seek(0)
+                handle.truncate()
+        stream.seek(0)
+        shutil.copyfileobj(stream, handle, length=UPLOAD_COPY_BUFFER)
 
 
-def to_relative(path: Path) -> str:
-    return path.relative_to(app.config["UPLOAD_ROOT"]).as_posix()
+def to_relative(path: Union[str, Path]) -> str:
+    value = os.fspath(path)
+    if not value.startswith(_UPLOAD_ROOT_PREFIX):
+        raise ValueError(f"{value!r} is not inside the upload root.")
+    return value[len(_UPLOAD_ROOT_PREFIX):].replace(os.sep, "/")
 
 
 def probe_video(path: Path) -> Dict[str, float]:
@@ -70,10 +145,10 @@ def probe_video(path: Path) -> Dict[str, float]:
         "ffprobe",
         "-v",
         "error",
-        "-select_streams",
-        "v:0",
         "-show_entries",
-        "stream=width,height",
+        "stream=codec_type,width,height",
+        "-show_entries",
+        "stream_tags=rotate:stream_side_data=rotation",
         "-show_entries",
         "format=duration",
         "-of",
@@ -82,11 +157,13 @@ def probe_video(path: Path) -> Dict[str, float]:
     ]
     result = run_command(command)
     try:
-        payload = json.loads(result.stdout)
-    except json.JSONDecodeError as exc:
+        payload = orjson.loads(result.stdout)
+    except orjson.JSONDecodeError as exc:
         raise ProcessingError("Unable to parse video metadata from ffprobe.") from exc
 
-    stream = (payload.get("streams") or [{}])[0]
+    streams = payload.get("streams") or []
+    stream = next((item for item in streams if item.get("codec_type") == "video"), {})
+    has_audio = any(item.get("codec_type") == "audio" for item in streams)
     format_info = payload.get("format", {})
     width = int(stream.get("width", 0))
     height = int(stream.get("height", 0))
@@ -100,110 +177,343 @@ def probe_video(path: Path) -> Dict[str, float]:
     if not width or not height:
         raise ProcessingError("Unable to determine source video resolution.")
 
-    return {"width": width, "height": height, "duration": duration}
+    # ffprobe reports coded dimensions; ffmpeg auto-rotates before scaling, so report display ones.
+    rotation = stream_rotation(stream)
+    if abs(rotation) % 180 == 90:
+        width, height = height, width
+
+    return {
+        "width": width,
+        "height": height,
+        "duration": duration,
+        "rotation": rotation,
+        "has_audio": has_audio,
+    }
+
+
+def stream_rotation(stream: Dict) -> int:
+    rotation = (stream.get("tags") or {}).get("rotate")
+    for side_data in stream.get("side_data_list") or []:
+        if "rotation" in side_data:
+            rotation = side_data["rotation"]
+    try:
+        return int(float(rotation or 0))
+    except (TypeError, ValueError):
+        return 0
 
 
 def crf_for_height(height: int) -> int:
-    if height >= 2160:
-        return 20
-    if height >= 1440:
-        return 21
-    if height >= 1080:
-        return 22
-    if height >= 720:
-        return 23
-    if height >= 480:
-        return 24
-    return 25
-
-
-def transcode_variant(
-    source_path: Path,
-    output_path: Path,
-    target_height: int,
-    segment_duration: int,
-) -> Dict[str, float]:
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    filters = f"scale=-2:{target_height}"
+    return _CRF_VALUES[bisect.bisect_right(_CRF_THRESHOLDS, height)]
+
+
+SOFTWARE_ENCODER: Dict = {
+    "codec": "libx264",
+    "input_args": [],
+    "scale_filter": "scale=-2:{height}",
+    "quality_args": ["-preset", "veryfast", "-crf", "{crf}", "-pix_fmt", "yuv420p"],
+    "device_args": [],
+    "upload_filter": None,
+}
+
+HARDWARE_ENCODERS: List[Dict] = [
+    {
+        "codec": "h264_nvenc",
+        "input_args": ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"],
+        "scale_filter": "scale_cuda=-2:{height}",
+        "quality_args": ["-preset", "p4", "-rc", "vbr", "-cq", "{crf}", "-b:v", "0", "-forced-idr", "1"],
+        "device_args": ["-init_hw_device", "cuda=hw", "-filter_hw_device", "hw"],
+        "upload_filter": "format=nv12,hwupload",
+    },
+    {
+        "codec": "h264_qsv",
+        "input_args": ["-hwaccel", "qsv", "-hwaccel_output_format", "qsv"],
+        "scale_filter": "scale_qsv=w=-2:h={height}",
+        "quality_args": ["-preset", "veryfast", "-global_quality", "{crf}", "-forced_idr", "1"],
+        "device_args": ["-init_hw_device", "qsv=hw", "-filter_hw_device", "hw"],
+        "upload_filter": "format=nv12,hwupload=extra_hw_frames=64",
+    },
+    {
+        "codec": "h264_vaapi",
+        "input_args": [
+            "-hwaccel",
+            "vaapi",
+            "-vaapi_device",
+            "/dev/dri/renderD128",
+            "-hwaccel_output_format",
+            "vaapi",
+        ],
+        "scale_filter": "scale_vaapi=w=-2:h={height}",
+        "quality_args": ["-qp", "{crf}"],
+        "device_args": ["-vaapi_device", "/dev/dri/renderD128"],
+        "upload_filter": "format=nv12,hwupload",
+    },
+]
+
+
+def hardware_encoder_available(encoder: Dict) -> bool:
+    # FFmpeg builds list encoders whose hardware or filters are missing, so push a test frame
+    # through the same upload, scale filter, and encoder the real job uses.
     command = [
         "ffmpeg",
-        "-y",
+        "-hide_banner",
+        "-v",
+        "error",
+        *encoder["device_args"],
+        "-f",
+        "lavfi",
+        "-i",
+        "color=size=256x256:duration=0.1",
+        "-vf",
+        f"{encoder['upload_filter']},{scale_filter(encoder, 128)}",
+        "-c:v",
+        encoder["codec"],
+        "-f",
+        "null",
+        "-",
+    ]
+    try:
+        run_command(command)
+    except ProcessingError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=1)
+def detect_encoder() -> Dict:
+    try:
+        result = run_command(["ffmpeg", "-hide_banner", "-encoders"])
+    except ProcessingError:
+        return SOFTWARE_ENCODER
+    for encoder in HARDWARE_ENCODERS:
+        if f" {encoder['codec']} " in result.stdout and hardware_encoder_available(encoder):
+            return encoder
+    return SOFTWARE_ENCODER
+
+
+def select_encoder(source_path: Path, allow_hardware: bool = True) -> Dict:
+    encoder = detect_encoder() if allow_hardware else SOFTWARE_ENCODER
+    if encoder is SOFTWARE_ENCODER:
+        return encoder
+    # Hardware decoding depends on the source codec, so run the real chain on the first frame
+    # and pick the CPU path up front instead of retrying a failed encode.
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-v",
+        "error",
+        *encoder["input_args"],
         "-i",
         str(source_path),
         "-map",
         "0:v:0",
-        "-map",
-        "0:a:0?",
+        "-frames:v",
+        "1",
         "-vf",
-        filters,
+        scale_filter(encoder, 128),
         "-c:v",
-        "libx264",
-        "-preset",
-        "veryfast",
-        "-crf",
-        str(crf_for_height(target_height)),
-        "-force_key_frames",
-        f"expr:gte(t,n_forced*{segment_duration})",
-        "-pix_fmt",
-        "yuv420p",
-        "-c:a",
-        "aac",
-        "-b:a",
-        "160k",
-        "-movflags",
-        "+faststart",
-        "-map_metadata",
-        "-1",
-        "-dn",
-        "-sn",
-        str(output_path),
+        encoder["codec"],
+        "-f",
+        "null",
+        "-",
     ]
-    run_command(command)
-    return probe_video(output_path)
+    try:
+        run_command(command)
+    except ProcessingError:
+        return SOFTWARE_ENCODER
+    return encoder
+
+
+def scale_filter(encoder: Dict, target_height: int) -> str:
+    return encoder["scale_filter"].format(height=target_height)
+
+
+def video_stream_arguments(arguments: List[str], stream_index: int) -> List[str]:
+    # All renditions share one HLS output, so scope each "-option value" pair to its video stream.
+    scoped = list(arguments)
+    for position in range(0, len(scoped), 2):
+        option = scoped[position]
+        scoped[position] = f"{option}:{stream_index}" if option.endswith(":v") else f"{option}:v:{stream_index}"
+    return scoped
+
+
+def encode_arguments(
+    stream_index: int,
+    target_height: int,
+    segment_duration: int,
+    encoder: Dict,
+    threads: int,
+) -> List[str]:
+    crf = str(crf_for_height(target_height))
+    return video_stream_arguments(
+        [
+            "-c:v",
+            encoder["codec"],
+            *(argument.replace("{crf}", crf) for argument in encoder["quality_args"]),
+            "-force_key_frames",
+            f"expr:gte(t,n_forced*{segment_duration})",
+            "-threads",
+            str(threads),
+        ],
+        stream_index,
+    )
+
+
+def hls_output_arguments(
+    targets: List[int],
+    hls_dir: Path,
+    segment_duration: int,
+    has_audio: bool,
+) -> List[str]:
+    # One hls muxer writes every rendition playlist plus master.m3u8, next to the %v directories.
+    stream_map = " ".join(
+        f"v:{index}" + (f",a:{index}" if has_audio else "") + f",name:{target}p"
+        for index, target in enumerate(targets)
+    )
+    return [
+        "-f",
+        "hls",
+        "-hls_time",
+        str(segment_duration),
+        "-hls_playlist_type",
+        "vod",
+        "-hls_flags",
+        "independent_segments",
+        "-hls_segment_filename",
+        str(hls_dir / "%v" / "segment_%03d.ts"),
+        "-master_pl_name",
+        "master.m3u8",
+        "-var_stream_map",
+        stream_map,
+        str(hls_dir / "%v" / "index.m3u8"),
+    ]
+
+
+def hls_playlist_path(hls_dir: Path, target_height: int) -> Path:
+    return hls_dir / f"{target_height}p" / "index.m3u8"
+
+
+def scaled_width(input_width: int, input_height: int, target_height: int) -> int:
+    # Same rounding as FFmpeg's scale=-2: nearest even width keeping the input aspect ratio.
+    return (target_height * input_width + input_height) // (2 * input_height) * 2
+
+
+def derive_variant_info(source_info: Dict[str, float], target_height: int) -> Dict[str, float]:
+    return {
+        "width": scaled_width(int(source_info["width"]), int(source_info["height"]), target_height),
+        "height": target_height,
+        "duration": source_info["duration"],
+    }
+
+
+def encoder_threads(output_count: int) -> int:
+    # The fused command runs one encoder per rendition side by side; share the cores between them.
+    return max(1, (os.cpu_count() or 1) // output_count)
 
 
-def segment_video(
+def build_scale_graph(targets: List[int], labels: List[str], cascade: bool, encoder: Dict) -> str:
+    if not cascade:
+        filter_graph = [f"[0:v:0]split={len(targets)}" + "".join(f"[{label}]" for label in labels)]
+        for label, target in zip(labels, targets):
+            filter_graph.append(f"[{label}]{scale_filter(encoder, target)}[{label}out]")
+        return ";".join(filter_graph)
+
+    # Scale each rendition from the next-higher one instead of the full-resolution source.
+    filter_graph = []
+    current_input = "0:v:0"
+    for index, (label, target) in enumerate(zip(labels, targets)):
+        chain = f"[{current_input}]{scale_filter(encoder, target)}"
+        if index == len(targets) - 1:
+            filter_graph.append(f"{chain}[{label}out]")
+        else:
+            filter_graph.append(f"{chain},split=2[{label}out][{label}next]")
+            current_input = f"{label}next"
+    return ";".join(filter_graph)
+
+
+def transcode_all_variants(
     source_path: Path,
-    destination_dir: Path,
+    targets: List[int],
+    hls_dir: Path,
     segment_duration: int,
-) -> List[Dict[str, object]]:
-    destination_dir.mkdir(parents=True, exist_ok=True)
-    pattern = destination_dir / f"{source_path.stem}_part_%03d.mp4"
+    source_info: Dict[str, float],
+    cascade: bool = True,
+) -> List[Tuple[int, Path, Dict[str, float], List[Dict[str, object]]]]:
+    # Decode the source once and fan the frames out to one scale/encode chain per target.
+    targets = sorted(targets, reverse=True)
+    labels = [f"v{index}" for index in range(len(targets))]
+    playlist_paths: List[Path] = []
+    for target in targets:
+        playlist_path = hls_playlist_path(hls_dir, target)
+        playlist_path.parent.mkdir(parents=True, exist_ok=True)
+        playlist_paths.append(playlist_path)
+
+    threads = encoder_threads(len(targets))
+    # FFmpeg skips auto-rotation for hardware frames, which would break the derived dimensions.
+    encoder = select_encoder(source_path, allow_hardware=not source_info.get("rotation"))
     command = [
         "ffmpeg",
         "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        *encoder["input_args"],
         "-i",
         str(source_path),
-        "-map",
-        "0:v:0",
-        "-map",
-        "0:a:0?",
-        "-c:v",
-        "copy",
-        "-c:a",
-        "copy",
-        "-map_metadata",
-        "-1",
-        "-dn",
-        "-sn",
-        "-f",
-        "segment",
-        "-segment_time",
-        str(segment_duration),
-        "-reset_timestamps",
-        "1",
-        "-segment_format",
-        "mp4",
-        str(pattern),
+        "-filter_complex",
+        build_scale_graph(targets, labels, cascade, encoder),
     ]
+    for index, (label, target) in enumerate(zip(labels, targets)):
+        command.extend(["-map", f"[{label}out]"])
+        if source_info.get("has_audio"):
+            command.extend(["-map", "0:a:0"])
+        command.extend(encode_arguments(index, target, segment_duration, encoder, threads))
+    command.extend(
+        [
+            "-c:a",
+            "aac",
+            "-b:a",
+            "160k",
+            "-map_metadata",
+            "-1",
+            "-dn",
+            "-sn",
+            *hls_output_arguments(targets, hls_dir, segment_duration, bool(source_info.get("has_audio"))),
+        ]
+    )
     run_command(command)
+
+    # The encode settings fully determine each output, so derive its metadata instead of probing it.
+    results = []
+    input_info = source_info
+    for target, playlist_path in zip(targets, playlist_paths):
+        variant_info = derive_variant_info(input_info, target)
+        if cascade:
+            input_info = variant_info
+        results.append(
+            (
+                target,
+                playlist_path,
+                variant_info,
+                collect_segments(playlist_path.parent, segment_duration),
+            )
+        )
+    return results
+
+
+def collect_segments(destination_dir: Path, segment_duration: int) -> List[Dict[str, object]]:
+    with os.scandir(destination_dir) as iterator:
+        entries = sorted(
+            (entry for entry in iterator if entry.name.endswith(".ts")),
+            key=lambda entry: entry.name,
+        )
+
     segment_entries: List[Dict[str, object]] = []
-    for index, item in enumerate(sorted(destination_dir.glob("*.mp4")), start=1):
+    for index, entry in enumerate(entries, start=1):
         segment_entries.append(
             {
                 "index": index,
-                "path": to_relative(item),
-                "size_bytes": item.stat().st_size,
+                "path": to_relative(entry.path),
+                "size_bytes": entry.stat().st_size,
                 "duration": segment_duration,
                 "label": f"Segment {index}",
             }
@@ -213,37 +523,61 @@ def segment_video(
 
 def sanitize_basename(filename: str) -> str:
     stem = Path(filename).stem
-    slug = re.sub(r"[^A-Za-z0-9-]+", "-", stem).strip("-").lower()
+    slug = _SLUG_RE.sub("-", stem).strip("-").lower()
     return slug or "playlist"
 
 
 def cleanup_playlist(path: Path) -> None:
     if path.exists():
-        shutil.rmtree(path)
+        # Rename first so the playlist disappears at once, then delete it off the request thread.
+        trash_path = path.with_name(path.name + TRASH_SUFFIX)
+        try:
+            path.rename(trash_path)
+        except OSError:
+            trash_path = path
+        _cleanup_pool.submit(shutil.rmtree, trash_path, ignore_errors=True)
+    invalidate_manifests_cache()
+
+
+def invalidate_manifests_cache() -> None:
+    global _manifests_generation
+    _manifests_generation += 1
 
 
-def load_manifest(playlist_id: str) -> Optional[Dict]:
-    manifest_path = app.config["UPLOAD_ROOT"] / playlist_id / "manifest.json"
-    if manifest_path.exists():
-        with manifest_path.open("r", encoding="utf-8") as handle:
-            return json.load(handle)
-    return None
+def manifests_mtime(root: Path) -> float:
+    # Adding or removing a playlist touches the root; writing a manifest touches its directory.
+    mtimes = [root.stat().st_mtime]
+    with os.scandir(root) as iterator:
+        for entry in iterator:
+            if entry.is_dir():
+                mtimes.append(entry.stat().st_mtime)
+    return max(mtimes)
 
 
-def list_manifests() -> List[Dict]:
+def list_manifests() -> Tuple[List[Dict], Dict[str, Dict]]:
+    global _manifests_cache
     manifests: List[Dict] = []
+    manifests_by_id: Dict[str, Dict] = {}
     root = app.config["UPLOAD_ROOT"]
     if not root.exists():
-        return manifests
+        return manifests, manifests_by_id
+
+    cache_key = (_manifests_generation, manifests_mtime(root))
+    if _manifests_cache is not None and _manifests_cache[0] == cache_key:
+        return _manifests_cache[1], _manifests_cache[2]
 
     for manifest_path in sorted(root.glob("*/manifest.json")):
+        if manifest_path.parent.name.endswith(TRASH_SUFFIX):
+            continue
         try:
-            with manifest_path.open("r", encoding="utf-8") as handle:
-                data = json.load(handle)
-        except (OSError, json.JSONDecodeError):
+            with manifest_path.open("rb") as handle:
+                data = orjson.loads(handle.read())
+        except (OSError, orjson.JSONDecodeError):
             continue
 
         playlist_id = data.get("playlist_id") or manifest_path.parent.name
+        manifests_by_id[playlist_id] = data
+        manifests_by_id.setdefault(manifest_path.parent.name, data)
         source = data.get("source", {})
         filename = source.get("filename") or playlist_id
         created_at = data.get("created_at")
@@ -276,7 +610,8 @@ def list_manifests() -> List[Dict]:
         return float(item.get("created_at_ts") or 0.0)
 
     manifests.sort(key=sort_key, reverse=True)
-    return manifests
+    _manifests_cache = (cache_key, manifests, manifests_by_id)
+    return manifests, manifests_by_id
 
 
 def summarise_manifest(manifest: Dict) -> Dict:
@@ -319,11 +654,8 @@ def summarise_manifest(manifest: Dict) -> Dict:
     other_variants.sort(key=lambda item: item.get("height") or 0, reverse=True)
 
     if master_variant:
-        master_variant = {
-            **master_variant,
-            "filename": source.get("filename", master_variant.get("file")),
-            "bitrate_kbps": master_variant.get("bitrate_kbps"),
-        }
+        # master_variant is always a fresh dict built above, so it can be extended in place.
+        master_variant["filename"] = source.get("filename", master_variant.get("file"))
 
     return {
         "playlist_id": manifest.get("playlist_id"),
@@ -342,47 +674,17 @@ def summarise_manifest(manifest: Dict) -> Dict:
 
 
 def build_player_payload(manifest: Dict) -> Dict:
+    # The player streams the HLS master playlist; the variants only drive its resolution controls.
     variants_payload: List[Dict] = []
     for variant_index, variant in enumerate(manifest.get("variants", []), start=1):
-        segments_payload = []
-        for segment_index, segment in enumerate(variant.get("segments", []), start=1):
-            if isinstance(segment, dict):
-                segment_path = segment.get("path")
-                segment_label = segment.get("label") or f"Segment {segment.get('index', segment_index)}"
-                segment_size = segment.get("size_bytes")
-                segment_duration = segment.get("duration")
-                segment_idx_value = segment.get("index", segment_index)
-            else:
-                segment_path = segment
-                segment_label = f"Segment {segment_index}"
-                segment_size = None
-                segment_duration = manifest.get("segment_duration")
-                segment_idx_value = segment_index
-
-            if not segment_path:
-                continue
-
-            segments_payload.append(
-                {
-                    "index": segment_idx_value,
-                    "label": segment_label,
-                    "url": url_for("media", filename=segment_path),
-                    "sizeBytes": segment_size,
-                    "duration": segment_duration,
-                }
-            )
-
         variant_file = variant.get("file")
-        if not variant_file:
-            continue
-
         variants_payload.append(
             {
                 "label": variant.get("label", ""),
                 "height": variant.get("height"),
                 "duration": variant.get("duration"),
-                "file": url_for("media", filename=variant_file),
-                "segments": segments_payload,
+                "file": url_for("media", filename=variant_file) if variant_file else None,
+                "segmentCount": len(variant.get("segments", [])),
                 "isMaster": variant.get("is_master", False),
                 "key": str(variant.get("height") or variant.get("label") or variant_index),
                 "bitrateKbps": variant.get("bitrate_kbps"),
@@ -392,9 +694,11 @@ def build_player_payload(manifest: Dict) -> Dict:
 
     variants_payload.sort(key=lambda item: item.get("height") or 0, reverse=True)
 
+    hls_master = manifest.get("hls_master")
     return {
         "playlistId": manifest.get("playlist_id"),
         "segmentDuration": manifest.get("segment_duration"),
+        "hlsMasterUrl": url_for("media", filename=hls_master) if hls_master else None,
         "variants": variants_payload,
     }
 
@@ -402,33 +706,41 @@ def build_player_payload(manifest: Dict) -> Dict:
 @app.route("/")
 def home() -> str:
     upload_summary: Optional[Dict] = None
-    player_payload_json: Optional[str] = None
-    available_playlists = list_manifests()
+    available_playlists, manifests_by_id = list_manifests()
 
-    last_upload_id = session.pop("last_upload_id", None)
-    requested_playlist = request.args.get("playlist")
-    selected_playlist_id = requested_playlist or last_upload_id
+    selected_playlist_id = request.args.get("playlist")
 
     if not selected_playlist_id and available_playlists:
         selected_playlist_id = available_playlists[0]["id"]
 
     active_playlist_id = None
     if selected_playlist_id:
-        manifest = load_manifest(selected_playlist_id)
+        manifest = manifests_by_id.get(selected_playlist_id)
         if manifest:
             active_playlist_id = manifest.get("playlist_id", selected_playlist_id)
             upload_summary = summarise_manifest(manifest)
-            player_payload = build_player_payload(manifest)
-            player_payload_json = json.dumps(player_payload)
     return render_template(
         "index.html",
         upload_summary=upload_summary,
-        player_payload_json=player_payload_json,
         available_playlists=available_playlists,
         active_playlist_id=active_playlist_id,
     )
 
 
+@app.route("/playlist/<playlist_id>.json")
+def playlist_payload(playlist_id: str):
+    _, manifests_by_id = list_manifests()
+    manifest = manifests_by_id.get(playlist_id)
+    if manifest is None:
+        abort(404)
+    response = app.response_class(
+        orjson.dumps(build_player_payload(manifest)),
+        mimetype="application/json",
+    )
+    response.headers["Cache-Control"] = "max-age=60"
+    return response
+
+
 @app.route("/upload", methods=["POST"])
 def upload() -> str:
     uploaded_file = request.files.get("video_file")
@@ -460,6 +772,7 @@ def upload() -> str:
         return redirect(url_for("home"))
 
     segment_duration = max(5, min(segment_duration, 600))
+    cascade = request.form.get("cascade") is not None
 
     safe_filename = secure_filename(uploaded_file.filename)
     if not safe_filename:
@@ -469,17 +782,15 @@ def upload() -> str:
     playlist_id = f"{sanitize_basename(safe_filename)}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
     playlist_dir = app.config["UPLOAD_ROOT"] / playlist_id
     source_dir = playlist_dir / "source"
-    variants_dir = playlist_dir / "variants"
-    segments_dir = playlist_dir / "segments"
+    hls_dir = playlist_dir / "hls"
     manifest_path = playlist_dir / "manifest.json"
 
     try:
         source_dir.mkdir(parents=True, exist_ok=False)
-        variants_dir.mkdir(parents=True, exist_ok=False)
-        segments_dir.mkdir(parents=True, exist_ok=False)
+        hls_dir.mkdir(parents=True, exist_ok=False)
 
         original_path = source_dir / safe_filename
-        uploaded_file.save(original_path)
+        save_upload(uploaded_file, original_path)
 
         source_info = probe_video(original_path)
         source_height = source_info["height"]
@@ -491,28 +802,19 @@ def upload() -> str:
         targets = [source_height] + [res for res in eligible_resolutions if res < source_height]
 
         manifest_variants: List[Dict] = []
-        base_stem = Path(safe_filename).stem
-
-        for target in targets:
-            variant_dir = variants_dir / f"{target}p"
-            variant_dir.mkdir(parents=True, exist_ok=True)
-            variant_filename = f"{base_stem}_{target}p.mp4"
-            variant_path = variant_dir / variant_filename
-
-            variant_info = transcode_variant(
-                source_path=original_path,
-                output_path=variant_path,
-                target_height=target,
-                segment_duration=segment_duration,
-            )
 
-            variant_segments = segment_video(
-                source_path=variant_path,
-                destination_dir=segments_dir / f"{target}p",
-                segment_duration=segment_duration,
-            )
+        transcoded_variants = transcode_all_variants(
+            source_path=original_path,
+            targets=targets,
+            hls_dir=hls_dir,
+            segment_duration=segment_duration,
+            source_info=source_info,
+            cascade=cascade,
+        )
 
-            variant_size_bytes = variant_path.stat().st_size
+        for target, playlist_path, variant_info, variant_segments in transcoded_variants:
+            # The HLS segments make up the whole rendition, so their sizes are already known.
+            variant_size_bytes = sum(int(segment["size_bytes"]) for segment in variant_segments)
             variant_duration = variant_info.get("duration") or segment_duration * max(len(variant_segments), 1)
             bitrate_kbps = 0.0
             if variant_duration:
@@ -524,7 +826,7 @@ def upload() -> str:
                     "height": variant_info["height"],
                     "width": variant_info["width"],
                     "duration": variant_info["duration"],
-                    "file": to_relative(variant_path),
+                    "playlist": to_relative(playlist_path),
                     "segments": variant_segments,
                     "is_master": target == source_height,
                     "size_bytes": variant_size_bytes,
@@ -548,18 +850,19 @@ def upload() -> str:
                 "duration": source_info["duration"],
             },
             "variants": manifest_variants,
+            "hls_master": to_relative(hls_dir / "master.m3u8"),
         }
 
-        with manifest_path.open("w", encoding="utf-8") as handle:
-            json.dump(manifest_payload, handle, indent=2)
+        with manifest_path.open("wb") as handle:
+            handle.write(orjson.dumps(manifest_payload, option=orjson.OPT_INDENT_2))
+        invalidate_manifests_cache()
 
         flash(f"Processed '{safe_filename}' and generated {len(manifest_variants)} renditions.", "success")
         if skipped_resolutions:
             skipped_list = ", ".join(f"{res}p" for res in skipped_resolutions)
             flash(f"Skipped {skipped_list} to avoid upscaling.", "info")
 
-        session["last_upload_id"] = playlist_id
-        return redirect(url_for("home"))
+        return redirect(url_for("home", playlist=playlist_id))
 
     except ProcessingError as exc:
         cleanup_playlist(playlist_dir)
@@ -574,9 +877,20 @@ def upload() -> str:
 @app.route("/media/<path:filename>")
 def media(filename: str):
     # Serve processed assets. Further authorization can be added later.
-    target = app.config["UPLOAD_ROOT"] / filename
-    if not target.exists():
-        abort(404)
+    accel_prefix = app.config["X_ACCEL_REDIRECT_PREFIX"]
+    if accel_prefix:
+        # nginx serves the file itself from its internal location; the worker only writes headers.
+        if safe_join(str(app.config["UPLOAD_ROOT"]), filename) is None:
+            abort(404)
+        response = app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        )
+        response.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{quote(filename)}"
+        return response
+
+    # send_from_directory already 404s on missing files and hands the open file to the
+    # server's wsgi.file_wrapper, which uses sendfile() where the server supports it.
+    # With USE_X_SENDFILE it only emits an X-Sendfile header for the fronting server.
     return send_from_directory(app.config["UPLOAD_ROOT"], filename)
 
 
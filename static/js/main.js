@@ -13,7 +13,7 @@ const resolutionList = document.getElementById('resolutionList');
 const segmentList = document.getElementById('segmentList');
 const currentResolutionLabel = document.getElementById('currentResolutionLabel');
 const currentSourceLabel = document.getElementById('currentSourceLabel');
-const playerDataScript = document.getElementById('playerData');
+const playerCard = document.getElementById('playerCard');
 const autoAdaptToggle = document.getElementById('autoAdaptToggle');
 
 if(menuToggle && sidebar){
@@ -97,13 +97,18 @@ if(uploadForm){
     });
 }
 
-if(playerDataScript){
-    try{
-        const playerData = JSON.parse(playerDataScript.textContent);
-        initialiseAdaptivePlayer(playerData);
-    } catch(error){
-        console.error('Failed to parse player data.', error);
-    }
+if(playerCard && playerCard.dataset.payloadUrl){
+    fetch(playerCard.dataset.payloadUrl)
+        .then((response) => {
+            if(!response.ok){
+                throw new Error(`Unexpected status ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(initialiseAdaptivePlayer)
+        .catch((error) => {
+            console.error('Failed to load player data.', error);
+        });
 }
 
 function initialiseAdaptivePlayer(playerData){
@@ -119,24 +124,55 @@ function initialiseAdaptivePlayer(playerData){
     const variantLabel = (variant) => variant.label || (variant.height ? `${variant.height}p` : 'Stream');
     const resolveVariantKey = (variant, index) => variant.key || `${variant.height || index}`;
     const segmentDurationSeconds = Number(playerData.segmentDuration) || 0;
-    const connection = navigator.connection || navigator.mozConnection || navigator.webkitConnection || null;
-    const throughputHistory = [];
-    let autoAdaptTimer = null;
-    let consecutiveDowngrades = 0;
-    let consecutiveUpgrades = 0;
+    const hlsMasterUrl = playerData.hlsMasterUrl || null;
+
+    variants.forEach((variant, index) => {
+        variant.__resolvedKey = resolveVariantKey(variant, index);
+    });
 
     let currentVariant = variants.find((variant) => variant.isMaster) || variants[0];
-    let currentSegmentIndex = 1;
-    let currentSegmentSrc = currentVariant.file;
-    let totalSegments = Array.isArray(currentVariant.segments) ? currentVariant.segments.length : 0;
-    let isFullVideoMode = true;
-    let pendingLoadedMetadataHandler = null;
-    let suppressEnded = false;
+    let currentSegmentIndex = 0;
+    let hls = null;
+    let playbackMode = 'file';
+
+    if(hlsMasterUrl && window.Hls && window.Hls.isSupported()){
+        // hls.js picks the rendition from measured throughput and buffer level.
+        playbackMode = 'hls';
+        hls = new window.Hls();
+        hls.loadSource(hlsMasterUrl);
+        hls.attachMedia(adaptivePlayer);
+        hls.on(window.Hls.Events.LEVEL_SWITCHED, (event, data) => {
+            const level = hls.levels[data.level];
+            const matched = level ? variants.find((variant) => Number(variant.height) === level.height) : null;
+            if(matched){
+                currentVariant = matched;
+                updateActiveResolution();
+                updateCurrentResolutionLabel();
+            }
+        });
+    } else if(hlsMasterUrl && adaptivePlayer.canPlayType('application/vnd.apple.mpegurl')){
+        // Safari plays HLS natively and always adapts on its own.
+        playbackMode = 'native';
+        adaptivePlayer.src = hlsMasterUrl;
+        if(autoAdaptToggle){
+            autoAdaptToggle.checked = true;
+            autoAdaptToggle.disabled = true;
+        }
+    } else if(currentVariant.file){
+        // Uploads processed before HLS output only have per-rendition MP4 files.
+        adaptivePlayer.src = currentVariant.file;
+    }
+
+    if(currentSourceLabel){
+        currentSourceLabel.textContent = playbackMode === 'file'
+            ? `${variantLabel(currentVariant)} - full video`
+            : 'Adaptive stream (HLS)';
+    }
 
     renderResolutionButtons();
-    setVariant(currentVariant, { segmentIndex: currentSegmentIndex, resumeTime: 0, isFullVideo: true });
+    populateSegments();
+    updateCurrentResolutionLabel();
     adaptivePlayer.addEventListener('timeupdate', handleTimeUpdate);
-    adaptivePlayer.addEventListener('ended', handleEnded);
 
     function renderResolutionButtons(){
         resolutionList.innerHTML = '';
@@ -144,180 +180,103 @@ function initialiseAdaptivePlayer(playerData){
             const button = document.createElement('button');
             button.type = 'button';
             button.className = 'chip';
+            button.disabled = playbackMode === 'native' || (playbackMode === 'file' && !variant.file);
             const labelSpan = document.createElement('span');
             labelSpan.className = 'chip__label';
             labelSpan.textContent = variantLabel(variant);
 
             const hintSpan = document.createElement('span');
             hintSpan.className = 'chip__hint';
-            const bandwidthText = formatBitrateHint(getVariantBitrate(variant));
-            hintSpan.textContent = bandwidthText;
+            hintSpan.textContent = formatBitrateHint(getVariantBitrate(variant));
 
             button.appendChild(labelSpan);
             button.appendChild(hintSpan);
-            const key = resolveVariantKey(variant, index);
-            variant.__resolvedKey = key;
-            button.dataset.key = key;
+            button.dataset.key = variant.__resolvedKey;
             button.dataset.variantIndex = String(index);
             button.addEventListener('click', () => {
-                if(currentVariant.__resolvedKey === variant.__resolvedKey){
-                    return;
-                }
-                const playbackContext = capturePlaybackContext();
                 disableAutoAdapt();
-                setVariant(variant, playbackContext);
+                selectVariant(variant);
             });
             resolutionList.appendChild(button);
         });
         updateActiveResolution();
     }
 
-    function setVariant(nextVariant, playbackContext){
-        currentVariant = nextVariant;
-        if(!currentVariant.__resolvedKey){
-            currentVariant.__resolvedKey = resolveVariantKey(currentVariant, variants.indexOf(currentVariant));
-        }
-        throughputHistory.length = 0;
-        consecutiveDowngrades = 0;
-        consecutiveUpgrades = 0;
-        if(!playbackContext){
-            playbackContext = { segmentIndex: 1, resumeTime: 0, isFullVideo: true };
+    function selectVariant(variant){
+        if(playbackMode === 'hls'){
+            const levelIndex = hls.levels.findIndex((level) => level.height === Number(variant.height));
+            if(levelIndex !== -1){
+                hls.currentLevel = levelIndex;
+            }
+        } else if(playbackMode === 'file' && variant.__resolvedKey !== currentVariant.__resolvedKey){
+            const resumeTime = Number.isFinite(adaptivePlayer.currentTime) ? adaptivePlayer.currentTime : 0;
+            const resume = () => {
+                adaptivePlayer.removeEventListener('loadedmetadata', resume);
+                adaptivePlayer.currentTime = resumeTime;
+                adaptivePlayer.play().catch(() => {});
+            };
+            adaptivePlayer.addEventListener('loadedmetadata', resume);
+            adaptivePlayer.src = variant.file;
+            adaptivePlayer.load();
+            if(currentSourceLabel){
+                currentSourceLabel.textContent = `${variantLabel(variant)} - full video`;
+            }
         }
+        currentVariant = variant;
         updateActiveResolution();
         updateCurrentResolutionLabel();
-        populateSegments(currentVariant);
-        totalSegments = Array.isArray(currentVariant.segments) ? currentVariant.segments.length : 0;
-
-        if(playbackContext.isFullVideo){
-            playFullVideo(playbackContext.resumeTime, playbackContext.segmentIndex);
-        } else if(!playSegmentByIndex(playbackContext.segmentIndex, playbackContext.resumeTime)){
-            playFullVideo(playbackContext.resumeTime, playbackContext.segmentIndex);
-        }
     }
 
-    function populateSegments(variant){
+    function populateSegments(){
+        // Every rendition shares the same key frame grid, so a segment is a fixed offset in the stream.
         segmentList.innerHTML = '';
-        segmentList.appendChild(createSegmentItem('full', 'Full video', variant.file));
-        (variant.segments || []).forEach((segment) => {
-            const label = segment.label || `Segment ${segment.index}`;
-            segmentList.appendChild(createSegmentItem(segment.index, label, segment.url));
-        });
+        segmentList.appendChild(createSegmentItem(0, 'Full video'));
+        const segmentCount = segmentDurationSeconds > 0 ? Number(currentVariant.segmentCount) || 0 : 0;
+        for(let index = 1; index <= segmentCount; index += 1){
+            segmentList.appendChild(createSegmentItem(index, `Segment ${index}`));
+        }
+        updateActiveSegment();
     }
 
-    function createSegmentItem(segmentIndex, label, sourceUrl){
+    function createSegmentItem(segmentIndex, label){
         const listItem = document.createElement('li');
         const button = document.createElement('button');
         button.type = 'button';
         button.className = 'segment-button';
         button.textContent = label;
         button.dataset.segmentIndex = String(segmentIndex);
-        button.dataset.src = sourceUrl;
         button.addEventListener('click', () => {
-            if(segmentIndex === 'full'){
-                playFullVideo(0, 1);
-            } else {
-                const parsed = Number(segmentIndex);
-                const targetIndex = Number.isNaN(parsed) ? segmentIndex : parsed;
-                playSegmentByIndex(targetIndex, 0);
-            }
+            const startTime = segmentIndex > 0 ? (segmentIndex - 1) * segmentDurationSeconds : 0;
+            adaptivePlayer.currentTime = startTime;
+            adaptivePlayer.play().catch(() => {});
         });
         listItem.appendChild(button);
         return listItem;
     }
 
-    function capturePlaybackContext(){
-        if(!adaptivePlayer){
-            return { segmentIndex: currentSegmentIndex, resumeTime: 0, isFullVideo: isFullVideoMode };
-        }
-        const time = Number.isFinite(adaptivePlayer.currentTime) ? adaptivePlayer.currentTime : 0;
-        const segmentIndexForResume = isFullVideoMode ? deriveSegmentIndex(null, time) : currentSegmentIndex;
-        return { segmentIndex: segmentIndexForResume, resumeTime: time, isFullVideo: isFullVideoMode };
-    }
-
-    function playFullVideo(resumeTime, segmentIndexHint){
-        isFullVideoMode = true;
-        currentSegmentIndex = deriveSegmentIndex(segmentIndexHint, resumeTime);
-        currentSegmentSrc = currentVariant.file;
-        setVideoSource(
-            currentVariant.file,
-            `${variantLabel(currentVariant)} - full video`,
-            resumeTime
-        );
-        return true;
-    }
-
-    function playSegmentByIndex(segmentIndex, resumeTime){
-        const lookup = String(segmentIndex);
-        const segments = currentVariant.segments || [];
-        const target = segments.find((segment) => String(segment.index) === lookup);
-        if(!target){
-            return false;
-        }
-        isFullVideoMode = false;
-        currentSegmentIndex = Number.isFinite(Number(target.index)) ? Number(target.index) : target.index;
-        currentSegmentSrc = target.url;
-        setVideoSource(
-            target.url,
-            `${variantLabel(currentVariant)} - ${target.label || `Segment ${target.index}`}`,
-            resumeTime
-        );
-        return true;
-    }
-
-    function setVideoSource(sourceUrl, readableLabel, resumeTime){
-        if(!adaptivePlayer){
+    function handleTimeUpdate(){
+        if(segmentDurationSeconds <= 0){
             return;
         }
-
-        const safeTime = Number.isFinite(resumeTime) && resumeTime > 0 ? resumeTime : 0;
-        currentSegmentSrc = sourceUrl;
-
-        if(currentSourceLabel){
-            currentSourceLabel.textContent = readableLabel;
-        }
-
-        if(pendingLoadedMetadataHandler){
-            adaptivePlayer.removeEventListener('loadedmetadata', pendingLoadedMetadataHandler);
-            pendingLoadedMetadataHandler = null;
-        }
-
-        const handleLoadedMetadata = () => {
-            adaptivePlayer.removeEventListener('loadedmetadata', handleLoadedMetadata);
-            if(safeTime > 0){
-                try{
-                    adaptivePlayer.currentTime = safeTime;
-                } catch(seekError){
-                    console.warn('Unable to seek to resume time.', seekError);
-                }
-            }
-            adaptivePlayer.play().catch(() => {});
+        const time = Number.isFinite(adaptivePlayer.currentTime) ? adaptivePlayer.currentTime : 0;
+        const nextIndex = Math.floor(time / segmentDurationSeconds) + 1;
+        if(nextIndex !== currentSegmentIndex){
+            currentSegmentIndex = nextIndex;
             updateActiveSegment();
-            suppressEnded = false;
-        };
-
-        pendingLoadedMetadataHandler = handleLoadedMetadata;
-        adaptivePlayer.addEventListener('loadedmetadata', handleLoadedMetadata);
-
-        suppressEnded = true;
-        if(autoAdaptTimer){
-            clearTimeout(autoAdaptTimer);
-            autoAdaptTimer = null;
         }
-        adaptivePlayer.pause();
-        adaptivePlayer.src = sourceUrl;
-        adaptivePlayer.load();
-        updateActiveSegment();
+    }
 
-        if(isAutoAdaptEnabled()){
-            scheduleAutoAdaptCheck(sourceUrl);
-        }
+    function updateActiveSegment(){
+        const buttons = segmentList.querySelectorAll('button');
+        buttons.forEach((button) => {
+            button.classList.toggle('segment-button--active', button.dataset.segmentIndex === String(currentSegmentIndex));
+        });
     }
 
     function updateActiveResolution(){
         const buttons = resolutionList.querySelectorAll('button');
-        const activeKey = currentVariant.__resolvedKey || resolveVariantKey(currentVariant, variants.indexOf(currentVariant));
         buttons.forEach((button) => {
-            const isActive = button.dataset.key === activeKey;
+            const isActive = button.dataset.key === currentVariant.__resolvedKey;
             button.classList.toggle('chip--active', isActive);
             button.classList.toggle('chip--auto-active', isActive && isAutoAdaptEnabled());
 
@@ -335,224 +294,6 @@ function initialiseAdaptivePlayer(playerData){
         });
     }
 
-    function updateActiveSegment(){
-        const buttons = segmentList.querySelectorAll('button');
-        buttons.forEach((button) => {
-            const buttonIndex = button.dataset.segmentIndex;
-            const isFullButton = buttonIndex === 'full';
-            let isActive = false;
-
-            if(isFullVideoMode){
-                const activeSegmentIndex = deriveSegmentIndex(null, adaptivePlayer ? adaptivePlayer.currentTime : 0);
-                isActive = (!isFullButton && String(activeSegmentIndex) === buttonIndex) || (isFullButton && button.dataset.src === currentSegmentSrc);
-            } else {
-                isActive = String(currentSegmentIndex) === buttonIndex;
-            }
-
-            button.classList.toggle('segment-button--active', isActive);
-        });
-    }
-
-    function deriveSegmentIndex(segmentIndexHint, resumeTime){
-        if(totalSegments === 0){
-            return 1;
-        }
-
-        if(Number.isFinite(segmentIndexHint) && segmentIndexHint >= 1 && segmentIndexHint <= totalSegments){
-            return Math.floor(segmentIndexHint);
-        }
-
-        const time = Number.isFinite(resumeTime) ? resumeTime : 0;
-        if(segmentDurationSeconds <= 0){
-            return 1;
-        }
-
-        const computedIndex = Math.floor(time / segmentDurationSeconds) + 1;
-        return Math.min(Math.max(computedIndex, 1), totalSegments);
-    }
-
-    function handleTimeUpdate(){
-        if(!isFullVideoMode || totalSegments === 0 || segmentDurationSeconds <= 0){
-            return;
-        }
-        const time = Number.isFinite(adaptivePlayer.currentTime) ? adaptivePlayer.currentTime : 0;
-        const nextIndex = deriveSegmentIndex(null, time);
-        if(nextIndex !== currentSegmentIndex){
-            currentSegmentIndex = nextIndex;
-            updateActiveSegment();
-        }
-    }
-
-    function handleEnded(){
-        if(suppressEnded){
-            return;
-        }
-
-        if(isFullVideoMode){
-            return;
-        }
-
-        const nextIndex = Number.isFinite(Number(currentSegmentIndex)) ? Number(currentSegmentIndex) + 1 : null;
-        if(nextIndex && nextIndex <= totalSegments){
-            playSegmentByIndex(nextIndex, 0);
-        }
-    }
-
-    function scheduleAutoAdaptCheck(sourceUrl){
-        if(autoAdaptTimer){
-            clearTimeout(autoAdaptTimer);
-        }
-        const absoluteUrl = normaliseUrl(sourceUrl);
-        autoAdaptTimer = window.setTimeout(() => {
-            maybeAutoAdapt(absoluteUrl);
-        }, 1200);
-    }
-
-    function maybeAutoAdapt(resourceUrl){
-        const measuredThroughput = measureThroughputKbps(resourceUrl);
-        const fallbackThroughput = connection && typeof connection.downlink === 'number' ? connection.downlink * 1000 : null;
-        const throughputKbps = measuredThroughput || fallbackThroughput;
-
-        if(!isAutoAdaptEnabled() || !throughputKbps || !currentVariant){
-            rescheduleAutoAdapt();
-            return;
-        }
-
-        throughputHistory.push(throughputKbps);
-        if(throughputHistory.length > 5){
-            throughputHistory.shift();
-        }
-
-    const averageThroughput = throughputHistory.reduce((sum, value) => sum + value, 0) / throughputHistory.length;
-    const currentBitrate = getVariantBitrate(currentVariant);
-        const headroomRatio = 0.85;
-
-        if(currentBitrate > 0 && averageThroughput < currentBitrate * 1.15){
-            consecutiveDowngrades += 1;
-            consecutiveUpgrades = 0;
-            const downgradeCandidate = findLowerVariant(currentVariant);
-            if(downgradeCandidate && consecutiveDowngrades >= 2){
-                const context = capturePlaybackContext();
-                throughputHistory.length = 0;
-                consecutiveDowngrades = 0;
-                setVariant(downgradeCandidate, context);
-                return;
-            }
-            rescheduleAutoAdapt();
-            return;
-        }
-
-        consecutiveDowngrades = 0;
-    const upgradeCandidate = selectVariantForThroughput(averageThroughput * headroomRatio);
-        if(upgradeCandidate && upgradeCandidate.__resolvedKey !== currentVariant.__resolvedKey){
-            consecutiveUpgrades += 1;
-            if(consecutiveUpgrades >= 3){
-                const context = capturePlaybackContext();
-                throughputHistory.length = 0;
-                consecutiveUpgrades = 0;
-                setVariant(upgradeCandidate, context);
-                return;
-            }
-        } else {
-            consecutiveUpgrades = 0;
-        }
-        rescheduleAutoAdapt();
-    }
-
-    function measureThroughputKbps(resourceUrl){
-        try{
-            const entries = performance.getEntriesByName(resourceUrl);
-            if(!entries || entries.length === 0){
-                return null;
-            }
-            const entry = entries[entries.length - 1];
-            const transferBytes = entry.transferSize || entry.encodedBodySize || entry.decodedBodySize;
-            const durationMs = entry.responseEnd - entry.requestStart;
-            if(!transferBytes || transferBytes <= 0 || !durationMs || durationMs <= 0){
-                return null;
-            }
-            const bits = transferBytes * 8;
-            const seconds = durationMs / 1000;
-            return (bits / seconds) / 1000;
-        } catch(error){
-            return null;
-        } finally {
-            trimResourceTimings();
-        }
-    }
-
-    function selectVariantForThroughput(throughputKbps){
-        if(!throughputKbps){
-            return null;
-        }
-        let candidate = null;
-        variants.forEach((variant, index) => {
-            if(!variant.__resolvedKey){
-                variant.__resolvedKey = resolveVariantKey(variant, index);
-            }
-            const bitrate = getVariantBitrate(variant);
-            if(bitrate && bitrate <= throughputKbps){
-                if(!candidate || bitrate > getVariantBitrate(candidate)){
-                    candidate = variant;
-                }
-            }
-        });
-        if(!candidate){
-            return null;
-        }
-        const candidateBitrate = getVariantBitrate(candidate);
-        const currentBitrate = getVariantBitrate(currentVariant);
-        if(candidateBitrate === 0 || candidateBitrate <= currentBitrate){
-            return null;
-        }
-        return candidate;
-    }
-
-    function findLowerVariant(referenceVariant){
-        const referenceKey = referenceVariant.__resolvedKey;
-        const referenceIndex = variants.findIndex((variant) => variant.__resolvedKey === referenceKey);
-        if(referenceIndex === -1){
-            return null;
-        }
-        for(let index = referenceIndex + 1; index < variants.length; index += 1){
-            const candidate = variants[index];
-            if(candidate){
-                if(!candidate.__resolvedKey){
-                    candidate.__resolvedKey = resolveVariantKey(candidate, index);
-                }
-                return candidate;
-            }
-        }
-        return null;
-    }
-
-    function trimResourceTimings(){
-        const entries = performance.getEntriesByType('resource');
-        if(entries && entries.length > 200){
-            performance.clearResourceTimings();
-        }
-    }
-
-    function normaliseUrl(url){
-        try{
-            return new URL(url, window.location.href).href;
-        } catch(error){
-            return url;
-        }
-    }
-
-    function rescheduleAutoAdapt(){
-        if(!isAutoAdaptEnabled()){
-            return;
-        }
-        if(autoAdaptTimer){
-            clearTimeout(autoAdaptTimer);
-        }
-        autoAdaptTimer = window.setTimeout(() => {
-            maybeAutoAdapt(normaliseUrl(currentSegmentSrc));
-        }, 4000);
-    }
-
     function getVariantBitrate(variant){
         if(!variant){
             return 0;
@@ -560,66 +301,31 @@ function initialiseAdaptivePlayer(playerData){
         if(variant.bitrateKbps && variant.bitrateKbps > 0){
             return variant.bitrateKbps;
         }
-        const inferredHeight = inferHeightFromVariant(variant);
-        if(!inferredHeight){
-            return 1500;
-        }
-        if(inferredHeight >= 2160){
-            return 14000;
-        }
-        if(inferredHeight >= 1440){
-            return 9000;
-        }
-        if(inferredHeight >= 1080){
-            return 6000;
-        }
-        if(inferredHeight >= 720){
-            return 3500;
-        }
-        if(inferredHeight >= 480){
-            return 1800;
-        }
-        return 900;
-    }
-
-    function inferHeightFromVariant(variant){
-        if(variant.height){
-            return Number(variant.height);
-        }
-        if(typeof variant.label === 'string'){
-            const match = variant.label.match(/(\d{3,4})p/i);
-            if(match){
-                return Number(match[1]);
-            }
-        }
-        return null;
+        return 0;
     }
 
     function isAutoAdaptEnabled(){
+        if(playbackMode === 'file'){
+            return false;
+        }
         return autoAdaptToggle ? autoAdaptToggle.checked : false;
     }
 
     function disableAutoAdapt(){
-        if(autoAdaptToggle){
+        if(autoAdaptToggle && playbackMode === 'hls'){
             autoAdaptToggle.checked = false;
         }
-        if(autoAdaptTimer){
-            clearTimeout(autoAdaptTimer);
-            autoAdaptTimer = null;
-        }
-        updateCurrentResolutionLabel();
     }
 
     if(autoAdaptToggle){
+        if(playbackMode === 'file'){
+            autoAdaptToggle.checked = false;
+            autoAdaptToggle.disabled = true;
+        }
         autoAdaptToggle.addEventListener('change', () => {
-            throughputHistory.length = 0;
-            consecutiveDowngrades = 0;
-            consecutiveUpgrades = 0;
-            if(autoAdaptToggle.checked){
-                rescheduleAutoAdapt();
-            } else if(autoAdaptTimer){
-                clearTimeout(autoAdaptTimer);
-                autoAdaptTimer = null;
+            if(playbackMode === 'hls'){
+                // -1 hands rendition choice back to hls.js; otherwise pin the rendition now playing.
+                hls.currentLevel = autoAdaptToggle.checked ? -1 : hls.currentLevel;
             }
             updateActiveResolution();
             updateCurrentResolutionLabel();